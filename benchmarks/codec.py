@@ -0,0 +1,116 @@
+"""Compare the JSON codec backends on dump-sized documents.
+
+    python -m benchmarks.codec [--artifacts N] [--repeat N]
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from src import codec
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _text(size):
+    words = ("".join(random.choices(string.ascii_lowercase, k=7)) for _ in range(size))
+    return "<div>" + " ".join(words) + " ✓ <b>done</b></div>"
+
+
+def _user(n):
+    return {
+        "emailAddress": f"user{n}@example.com",
+        "firstName": "User",
+        "lastName": str(n),
+    }
+
+
+def make_artifact(object_id, depth=2):
+    artifact = {
+        "objectId": object_id,
+        "project": "Example Project",
+        "name": f"Artifact {object_id}",
+        "release": {
+            "objectId": 1,
+            "name": "2021.1",
+            "releaseDate": "2021-03-31T05:59:59.000Z",
+            "planEstimate": 120.5,
+        },
+        "type": "HierarchicalRequirement",
+        "state": "Defined",
+        "scheduleState": "In-Progress",
+        "blocked": False,
+        "formattedId": f"US{object_id}",
+        "description": _text(400),
+        "notes": _text(100),
+        "milestones": [{"objectId": 2, "name": "GA", "targetDate": None}],
+        "createdBy": _user(object_id % 50),
+        "creationDate": "2020-11-02T15:04:05.123Z",
+        "planEstimate": 3.0,
+        "attachments": [
+            {"name": f"shot{n}.png", "objectId": object_id * 10 + n, "user": _user(n)}
+            for n in range(3)
+        ],
+        "discussion": [
+            {"user": _user(n), "text": _text(60), "creationDate": "2021-01-01"}
+            for n in range(5)
+        ],
+        "parent": None,
+        "clientNames": ["Acme", "Globex"],
+    }
+    if depth:
+        artifact["children"] = [
+            make_artifact(object_id * 100 + n, depth - 1) for n in range(3)
+        ]
+    return artifact
+
+
+def _time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        before = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - before)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--artifacts", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    documents = [make_artifact(n) for n in range(1, args.artifacts + 1)]
+    encoded = [codec.verify(document) for document in documents]
+    megabytes = sum(len(e.encode()) for e in encoded) / (1024 * 1024)
+    print(f"{args.artifacts} artifacts, {megabytes:.1f} MB, encodings byte-identical")
+
+    backends = {
+        "json": (
+            lambda: [codec._stdlib_dumps(d) for d in documents],
+            lambda: [json.loads(e) for e in encoded],
+        ),
+    }
+    if orjson:
+        backends["orjson"] = (
+            lambda: [codec._orjson_dumps(d) for d in documents],
+            lambda: [orjson.loads(e) for e in encoded],
+        )
+
+    baseline = None
+    for name, (encode, decode) in backends.items():
+        timings = (_time(encode, args.repeat), _time(decode, args.repeat))
+        baseline = baseline or timings
+        print(
+            f"{name:>6}: dumps {timings[0]:.3f}s ({baseline[0] / timings[0]:.1f}x)"
+            f"  loads {timings[1]:.3f}s ({baseline[1] / timings[1]:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
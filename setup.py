@@ -20,5 +20,6 @@ setuptools.setup(
     ],
     python_requires=">=3.9",
     install_requires=["click", "pyral", "toml", "tqdm", "jira"],
+    extras_require={"fast": ["orjson"]},
     scripts=["bin/rally-to-anything", "bin/manage-jira"],
 )
@@ -0,0 +1,78 @@
+"""JSON codec for the dump, load & import paths.
+
+Uses orjson when it is installed and falls back to the standard library otherwise.
+Both backends emit equivalent compact UTF-8 JSON, though not always the same bytes,
+e.g. orjson writes 1e-7 where the standard library writes 1e-07. Set
+RALLY_TO_ANYTHING_JSON=json to force the standard library or
+RALLY_TO_ANYTHING_JSON_CHECK=1 to compare every encoding against it.
+"""
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+BACKEND = (
+    "orjson"
+    if orjson and os.environ.get("RALLY_TO_ANYTHING_JSON") != "json"
+    else "json"
+)
+CHECK = bool(os.environ.get("RALLY_TO_ANYTHING_JSON_CHECK"))
+
+
+class CodecMismatchError(ValueError):
+    pass
+
+
+def _stdlib_dumps(obj, default=None):
+    return json.dumps(obj, default=default, separators=(",", ":"), ensure_ascii=False)
+
+
+def _orjson_dumps(obj, default=None):
+    return orjson.dumps(obj, default=default).decode()
+
+
+def verify(obj, default=None):
+    """Raise CodecMismatchError unless both backends encode obj byte for byte alike."""
+    expected = _stdlib_dumps(obj, default=default)
+    if orjson:
+        # the default hook has side effects while dumping, e.g. downloading
+        # attachments, so orjson encodes what the hook already expanded
+        try:
+            actual = orjson.dumps(json.loads(expected)).decode()
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits, only the stdlib encodes those
+            return expected
+        if actual != expected:
+            raise CodecMismatchError(
+                f"orjson and json encodings differ: {actual[:200]!r} != {expected[:200]!r}"
+            )
+    return expected
+
+
+def dumps(obj, default=None):
+    if CHECK:
+        return verify(obj, default=default)
+    if BACKEND == "orjson":
+        return _orjson_dumps(obj, default=default)
+    return _stdlib_dumps(obj, default=default)
+
+
+def loads(data):
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump(obj, f, default=None):
+    if BACKEND == "json" and not CHECK:
+        # the standard library encodes in chunks straight into f
+        json.dump(obj, f, default=default, separators=(",", ":"), ensure_ascii=False)
+        return
+    f.write(dumps(obj, default=default))
+
+
+def load(f):
+    return loads(f.read())
@@ -0,0 +1,46 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+
+def fingerprint(artifact):
+    # always the standard library, so switching codec backends changes nothing
+    return hashlib.sha256(json.dumps(artifact, sort_keys=True).encode()).hexdigest()
+
+
+class BuildState(object):
+    """Fingerprint of every top-level artifact as of the last import build."""
+
+    def __init__(self, config):
+        settings = config["jira"].get("build_state", {})
+        self.path = settings.get(
+            "path",
+            os.path.join(
+                os.path.dirname(config["jira"]["json"]["filepath"]),
+                "build-state.sqlite",
+            ),
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints"
+            " (object_id INTEGER PRIMARY KEY, fingerprint TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+    def fingerprints(self):
+        return dict(self._db.execute("SELECT object_id, fingerprint FROM fingerprints"))
+
+    def record(self, object_id, artifact_fingerprint):
+        # committed once the import files are written, see commit()
+        self._db.execute(
+            "INSERT OR REPLACE INTO fingerprints VALUES (?, ?)",
+            (object_id, artifact_fingerprint),
+        )
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,113 @@
+import concurrent.futures
+import threading
+import time
+
+import tqdm
+
+from src.retry import RETRY_STATUSES, get_backoff
+
+
+def _get_response(exc):
+    return getattr(exc, "response", None)
+
+
+def _get_status(exc):
+    # JIRAError carries its status, zenpy's APIException only its response
+    return getattr(exc, "status_code", None) or getattr(
+        _get_response(exc), "status_code", None
+    )
+
+
+class BulkExecutor(object):
+    """Runs one API mutation per item on a bounded thread pool.
+
+    Throttled & failing requests are retried, honouring Retry-After, every other
+    error is collected per item so a long pass is never stopped by one bad issue.
+    """
+
+    def __init__(
+        self,
+        description,
+        total=None,
+        dry_run=False,
+        workers=8,
+        max_retries=5,
+        backoff_base=1,
+        backoff_max=60,
+    ):
+        self.description = description
+        self.dry_run = dry_run
+        self.workers = max(1, workers)
+        self.max_in_flight = self.workers * 2
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self.planned = 0
+        self.succeeded = 0
+        self.retries = 0
+        self.failures = []
+        self.progress = tqdm.tqdm(desc=description, total=total, disable=dry_run)
+
+    def plan(self, count):
+        """Count changes for a dry run that already knows how many there are."""
+        self.planned += count
+
+    def run(self, items, operation, label=str):
+        """Apply operation to every item, returning once all of them are done."""
+        if self.dry_run:
+            for _ in items:
+                self.planned += 1
+            return
+
+        in_flight = set()
+        for item in items:
+            self.planned += 1
+            if len(in_flight) >= self.max_in_flight:
+                _, in_flight = concurrent.futures.wait(
+                    in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+            in_flight.add(self._executor.submit(self._apply, item, operation, label))
+        concurrent.futures.wait(in_flight)
+
+    def _apply(self, item, operation, label):
+        attempt = 0
+        while True:
+            try:
+                operation(item)
+            except Exception as exc:
+                if _get_status(exc) in RETRY_STATUSES and attempt < self.max_retries:
+                    with self._lock:
+                        self.retries += 1
+                    delay = get_backoff(
+                        attempt, _get_response(exc), self.backoff_base, self.backoff_max
+                    )
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                with self._lock:
+                    self.failures.append((label(item), exc))
+                tqdm.tqdm.write(f"WARN - Failed {label(item)}: {exc}")
+            else:
+                with self._lock:
+                    self.succeeded += 1
+            self.progress.update()
+            return
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.progress.close()
+
+    def report(self):
+        if self.dry_run:
+            return (
+                f"Dry run! {self.description}: would have made {self.planned} changes."
+            )
+        elapsed = time.time() - self._started
+        return (
+            f"{self.description}: {self.succeeded} of {self.planned} succeeded in"
+            f" {elapsed:.2f} seconds, {self.retries} retries,"
+            f" {len(self.failures)} failed"
+        )
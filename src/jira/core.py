@@ -1,4 +1,6 @@
-import json
+import collections
+import concurrent.futures
+import functools
 import os
 from datetime import datetime
 
@@ -6,9 +8,15 @@ import boto3
 import tqdm
 from botocore.client import Config
 
+from .build import BuildState, fingerprint
+from .graph import ArtifactGraph, iter_children
+from .ledger import UploadLedger
 from .text import RallyTextTranslator
-from src.rally.artifacts import RallyArtifact
-from src.rally.attachments import RallyAttachment
+from .uploads import AttachmentUploader
+from .writer import ImportJSONWriter
+from src.rally.artifacts import CHILD_ATTRIBUTES, RELATED_DIRECTORY
+from src.rally.attachments import AttachmentIndex, RallyAttachment
+from src.rally.store import get_artifact_store
 
 
 class RallyArtifactTranslator(object):
@@ -18,6 +26,7 @@ class RallyArtifactTranslator(object):
         self._config = self.migrator._config
         self.mappings = self._config["jira"]["mappings"]
         self.text_translator = RallyTextTranslator(self._config)
+        self.attachment_index = AttachmentIndex.for_config(self._config)
         self.today = datetime.now()
 
     def create_issue(self, artifact):
@@ -80,17 +89,18 @@ class RallyArtifactTranslator(object):
 
     def _get_attachments(self, artifact):
         attachments = []
-        for attachment in tqdm.tqdm(artifact["attachments"], "Uploading Attachments"):
+        for attachment in artifact["attachments"]:
             attachment_filepath = self._get_attachment_filepath(attachment)
             if os.path.exists(attachment_filepath):
-                url = self._get_s3_presignedurl(attachment_filepath)
+                s3_key = self._upload_attachment_to_s3(attachment, attachment_filepath)
                 attachments.append(
                     {
                         "name": f"{attachment['name']} - {attachment['objectId']}",
                         "attacher": self._get_user(attachment["user"]),
                         "created": attachment["creationDate"],
                         "description": attachment["description"],
-                        "uri": url,
+                        # presigned by the migrator when the issue is written
+                        "uri": s3_key,
                     }
                 )
             else:
@@ -99,7 +109,7 @@ class RallyArtifactTranslator(object):
         return attachments
 
     def _get_attachment_filepath(self, attachment):
-        return os.path.join(
+        filepath = os.path.join(
             RallyAttachment.output_root(self._config),
             "slm",
             "webservice",
@@ -108,29 +118,19 @@ class RallyArtifactTranslator(object):
             str(attachment["objectId"]),
             attachment["name"],
         )
-
-    def _get_s3_presignedurl(self, attachment_filepath):
-        s3_key = self._upload_attachment_to_s3(attachment_filepath)
-        url = self.migrator.s3_client.generate_presigned_url(
-            ClientMethod="get_object",
-            Params={
-                "Bucket": self._config["aws"]["bucket_name"],
-                "Key": s3_key,
-            },
-            HttpMethod="Get",
-            ExpiresIn=self._config["aws"]["s3_presign_expires"],
+        sha256 = self.attachment_index.get(attachment["objectId"])
+        if not os.path.exists(filepath) and sha256:
+            return self.attachment_index.blob_path(sha256)
+        return filepath
+
+    def _upload_attachment_to_s3(self, attachment, attachment_filepath):
+        # content addressed keys, identical files are uploaded once
+        sha256 = self.attachment_index.lookup_or_hash(
+            attachment["objectId"], attachment_filepath
         )
-        return url
-
-    def _upload_attachment_to_s3(self, attachment_filepath):
-        dirs, filename = os.path.split(attachment_filepath)
-        s3_key = os.path.join("attachments", os.path.basename(dirs), filename)
+        s3_key = os.path.join("attachments", "sha256", sha256)
         if not self.skip_attachment_upload:
-            self.migrator.s3_client.upload_file(
-                attachment_filepath,
-                Bucket=self._config["aws"]["bucket_name"],
-                Key=s3_key,
-            )
+            self.migrator.queue_upload(attachment_filepath, s3_key, sha256)
         return s3_key
 
     def _get_comments(self, artifact, zendesk_tickets):
@@ -317,77 +317,314 @@ class JiraMigrator(object):
     def __init__(self, config, verbose, object_ids=None):
         self._config = config
         self.verbose = verbose
-        boto3.setup_default_session(profile_name=config["aws"]["sso_profile"])
+        # no profile when pointed at a local S3 stand-in through s3_endpoint_url
+        boto3.setup_default_session(profile_name=config["aws"].get("sso_profile"))
         self.s3_client = boto3.client(
             "s3",
             region_name=config["aws"]["region"],
             config=Config(signature_version="s3v4"),
             endpoint_url=config["aws"]["s3_endpoint_url"],
         )
-        self.rally_artifacts = self.load_rally_artifacts(object_ids)
+        self.store = get_artifact_store(config)
+        self.object_ids = [int(object_id) for object_id in object_ids or ()]
+        # ObjectID -> section, all that is kept in memory of the dump itself
+        self.artifact_sections = {}
+        for (section, object_id) in self.store.keys():
+            # an artifact dumped under its own section wins over a _related copy
+            if section != RELATED_DIRECTORY or object_id not in self.artifact_sections:
+                self.artifact_sections[object_id] = section
+        self._get_rally_artifact = functools.lru_cache(maxsize=1024)(
+            self._load_rally_artifact
+        )
         self.jira_users = {}
         self.translator = None
+        self.graph = None
+        self.fingerprints = {}
+        self.uploader = None
+        self.pending_uploads = []
         self.project = self._config["jira"]["project"].copy()
 
-    def load_rally_artifacts(self, object_ids=None):
-        rally_artifacts = []
-        artifact_root = RallyArtifact.output_root(self._config)
-        for (dirpath, _, files) in os.walk(artifact_root):
-            for filepath in files:
-                if object_ids:
-                    object_id, _ = filepath.split(".")
-                    if object_id not in object_ids:
-                        continue
-                with open(os.path.join(dirpath, filepath), "r") as f:
-                    rally_artifacts.append(json.load(f))
-        return rally_artifacts
-
-    def build_import_json(self, skip_attachment_upload=False):
-        self.translator = RallyArtifactTranslator(self, skip_attachment_upload)
-        self.project["issues"] = []
-        self.project["versions"] = []
-        import_json = {
-            "users": [],
-            "links": [],
-            "projects": [self.project],
-        }
-
-        for artifact in tqdm.tqdm(self.rally_artifacts, "Artifacts"):
-            issue = self.translator.create_issue(artifact)
-
-            if artifact["parent"]:
-                if artifact["parent"]["type"] == "PortfolioItem/Epic":
-                    issue["labels"].append(artifact["parent"]["name"])
-
-            self.project["issues"].append(issue)
-            self._add_children(import_json, artifact, issue)
-
-        import_json["users"] = [
-            {"email": email, **user} for (email, user) in self.jira_users.items()
+    @property
+    def num_rally_artifacts(self):
+        return len(self.top_level_object_ids())
+
+    def top_level_object_ids(self):
+        if self.object_ids:
+            return self.object_ids
+        return [
+            object_id
+            for (object_id, section) in self.artifact_sections.items()
+            if section != RELATED_DIRECTORY
         ]
-        self._write_json_file(import_json)
 
-    def _add_children(self, import_json, artifact, issue):
-        for child_attrs in ("children", "stories", "tasks"):
-            for child in artifact.get(child_attrs, []):
-                child_issue = self.translator.create_issue(child)
-                self._add_issue_links(import_json, issue, child_issue)
-                self.project["issues"].append(child_issue)
-                self._add_children(import_json, child, child_issue)
+    def iter_rally_artifacts(self):
+        """Stream the dumped artifacts one at a time, resolving normalized references."""
+        if self.object_ids:
+            rally_artifacts = (
+                self._load_rally_artifact(object_id) for object_id in self.object_ids
+            )
+        else:
+            rally_artifacts = (
+                artifact
+                for (section, artifact) in self.store.artifacts()
+                if section != RELATED_DIRECTORY
+            )
 
-    def _add_issue_links(self, import_json, issue, child_issue):
-        if issue["issueType"] == "Epic":
-            child_issue["customFieldValues"].append(
-                {
-                    "fieldName": "Epic Link",
-                    "fieldType": "com.pyxis.greenhopper.jira:gh-epic-link",
-                    "value": issue["summary"],
-                }
+        for artifact in rally_artifacts:
+            if artifact:
+                yield self._resolve_references(artifact)
+
+    def index_attachments(self, object_ids):
+        """Map attachment ObjectIDs to the (artifact, attachment) they belong to."""
+        remaining = set(object_ids)
+        index = {}
+        for (_, artifact) in self.store.artifacts():
+            for attachment in artifact.get("attachments", ()):
+                if attachment["objectId"] in remaining:
+                    remaining.discard(attachment["objectId"])
+                    index[attachment["objectId"]] = (artifact, attachment)
+            if not remaining:
+                break
+        return index
+
+    def get_rally_artifact(self, object_id):
+        artifact = self._get_rally_artifact(int(object_id))
+        return artifact and self._resolve_references(artifact)
+
+    def _load_rally_artifact(self, object_id):
+        section = self.artifact_sections.get(object_id)
+        if section:
+            return self.store.get(object_id, section)
+
+    def _resolve_references(self, artifact, recurse_parent=True, recurse_children=True):
+        """Expand the ObjectID references of a normalized dump into nested artifacts."""
+        if not artifact.get("normalized"):
+            return artifact
+
+        resolved = dict(artifact)
+        parent_id = artifact.get("parent")
+        parent = parent_id and self._get_rally_artifact(parent_id)
+        if recurse_parent:
+            resolved["parent"] = parent and self._resolve_references(
+                parent, recurse_children=False
+            )
+        else:
+            resolved.pop("parent", None)
+
+        for (key, _) in CHILD_ATTRIBUTES:
+            if key not in artifact:
+                continue
+            if recurse_children:
+                children = [self._get_rally_artifact(c) for c in artifact[key]]
+                resolved[key] = [
+                    self._resolve_references(child, recurse_parent=False)
+                    for child in children
+                    if child
+                ]
+            else:
+                resolved.pop(key)
+
+        return resolved
+
+    def build_import_json(
+        self,
+        skip_attachment_upload=False,
+        max_file_issues=None,
+        max_file_bytes=None,
+        processes=1,
+        reconcile_ledger=False,
+        since_last_build=False,
+    ):
+        self.translator = RallyArtifactTranslator(self, skip_attachment_upload)
+        filepath = self._config["jira"]["json"]["filepath"]
+        if since_last_build:
+            root, extension = os.path.splitext(filepath)
+            filepath = f"{root}-delta{extension}"
+        self.writer = ImportJSONWriter(
+            self._config,
+            max_issues=max_file_issues,
+            max_bytes=max_file_bytes,
+            filepath=filepath,
+        )
+        self.project["versions"] = []
+        if not skip_attachment_upload:
+            ledger = UploadLedger(self._config)
+            if reconcile_ledger:
+                listed = ledger.reconcile(
+                    self.s3_client, self._config["aws"]["bucket_name"]
+                )
+                print(f"Reconciled the upload ledger against {listed} S3 objects.")
+            self.uploader = AttachmentUploader(self.s3_client, self._config, ledger)
+        self.graph = self.build_artifact_graph()
+        build_state = BuildState(self._config)
+
+        object_ids = None
+        if since_last_build:
+            previous = build_state.fingerprints()
+            object_ids = [
+                object_id
+                for (object_id, artifact_fingerprint) in self.fingerprints.items()
+                if previous.get(object_id) != artifact_fingerprint
+            ]
+            print(
+                f"{len(object_ids)} of {len(self.fingerprints)} artifacts changed"
+                " since the last build."
+            )
+
+        if processes > 1:
+            translations = self._translate_in_processes(
+                processes, skip_attachment_upload, object_ids
             )
         else:
-            issue_link = self._get_issue_link(issue, child_issue)
+            translations = self._translate_serially(object_ids)
+
+        for (object_id, translated) in tqdm.tqdm(
+            translations,
+            "Artifacts",
+            total=self.num_rally_artifacts if object_ids is None else len(object_ids),
+        ):
+            build_state.record(object_id, self.fingerprints[object_id])
+            for issue in translated:
+                self._presign_attachments(issue)
+                self.writer.write_issue(issue)
+
+        # links are derived from the graph once every issue has been written, a
+        # delta build only carries the links touching the issues it re-emitted
+        for (parent, child) in self.graph.edges():
+            if not (
+                self.writer.has_issue(parent["externalId"])
+                or self.writer.has_issue(child["externalId"])
+            ):
+                continue
+            issue_link = self._get_issue_link(parent, child)
             if issue_link:
-                import_json["links"].append(issue_link)
+                self.writer.add_link(issue_link)
+
+        if self.uploader:
+            self.uploader.close()
+            print(self.uploader.report())
+        if self.verbose:
+            print(
+                f"Translated {len(self.graph.owners)} unique artifacts,"
+                f" skipped {self.graph.duplicates} duplicates."
+            )
+            print(self.translator.text_translator.cache.report())
+
+        users = [{"email": email, **user} for (email, user) in self.jira_users.items()]
+        project = {k: v for (k, v) in self.project.items() if k != "versions"}
+        filepaths = self.writer.close(project, users, self.project["versions"])
+        # only remember what was built once the import files are on disk & every
+        # attachment they reference is in S3, otherwise the next delta redoes it
+        if not self.upload_failures:
+            build_state.commit()
+        build_state.close()
+        return filepaths
+
+    @property
+    def upload_failures(self):
+        return self.uploader.failures if self.uploader else []
+
+    def queue_upload(self, filepath, s3_key, sha256=None):
+        if self.uploader:
+            self.uploader.submit(filepath, s3_key, sha256)
+        else:
+            # translation workers hand their uploads back to the parent
+            self.pending_uploads.append((filepath, s3_key, sha256))
+
+    def _presign_attachments(self, issue):
+        for attachment in issue["attachments"]:
+            attachment["uri"] = self.s3_client.generate_presigned_url(
+                ClientMethod="get_object",
+                Params={
+                    "Bucket": self._config["aws"]["bucket_name"],
+                    "Key": attachment["uri"],
+                },
+                HttpMethod="Get",
+                ExpiresIn=self._config["aws"]["s3_presign_expires"],
+            )
+
+    def build_artifact_graph(self):
+        graph = ArtifactGraph(self._config["jira"]["mappings"]["artifacts"])
+        graph.add_top_level(self.top_level_object_ids())
+        for artifact in tqdm.tqdm(
+            self.iter_rally_artifacts(),
+            "Artifact Graph",
+            total=self.num_rally_artifacts,
+        ):
+            graph.add_artifact(artifact)
+            self.fingerprints[artifact["objectId"]] = fingerprint(artifact)
+        return graph
+
+    def _translate_serially(self, object_ids=None):
+        if object_ids is None:
+            artifacts = self.iter_rally_artifacts()
+        else:
+            artifacts = filter(None, map(self.get_rally_artifact, object_ids))
+        for artifact in artifacts:
+            yield artifact["objectId"], self.translate_artifact(artifact)
+
+    def translate_artifact(self, artifact):
+        """Return the issues of an artifact & the children the graph assigned to it."""
+        translated = []
+        self._add_issues(artifact, artifact["objectId"], translated)
+        return translated
+
+    def _add_issues(self, artifact, owner, translated):
+        object_id = artifact["objectId"]
+        if self.graph.owners.get(object_id) == owner:
+            issue = self.translator.create_issue(artifact)
+            self.graph.decorate_issue(object_id, issue)
+            translated.append(issue)
+        for child in iter_children(artifact):
+            self._add_issues(child, owner, translated)
+
+    def _translate_in_processes(
+        self, processes, skip_attachment_upload, object_ids=None
+    ):
+        """Translate shards of artifacts in worker processes, yielding in dump order.
+
+        Every worker hands back the users & versions its shard introduced, they are
+        merged in shard order so the result matches a serial build.
+        """
+        if object_ids is None:
+            object_ids = self.top_level_object_ids()
+        shard_size = self._config["jira"].get("translation_shard_size", 25)
+        shards = (
+            object_ids[start : start + shard_size]
+            for start in range(0, len(object_ids), shard_size)
+        )
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=_init_translation_worker,
+            initargs=(
+                self._config,
+                self.verbose,
+                skip_attachment_upload,
+                self.graph,
+            ),
+        ) as executor:
+            # a bounded window of shards keeps results flowing in order
+            pending = collections.deque()
+            for shard in shards:
+                pending.append(executor.submit(_translate_shard, shard))
+                if len(pending) >= processes * 2:
+                    yield from self._merge_shard(pending.popleft().result())
+            while pending:
+                yield from self._merge_shard(pending.popleft().result())
+
+    def _merge_shard(self, shard_result):
+        translations, jira_users, versions, text_cache_stats, uploads = shard_result
+        for (filepath, s3_key, sha256) in uploads:
+            self.queue_upload(filepath, s3_key, sha256)
+        self.translator.text_translator.cache.stats.update(text_cache_stats)
+        for (email, user) in jira_users.items():
+            self.jira_users.setdefault(email, user)
+        existing_versions = [v["name"] for v in self.project["versions"]]
+        for version in versions:
+            if version["name"] not in existing_versions:
+                self.project["versions"].append(version)
+                existing_versions.append(version["name"])
+        return translations
 
     def _get_issue_link(self, issue, child_issue):
         link_type = self._config["jira"]["mappings"]["issuelinking"].get(
@@ -407,8 +644,36 @@ class JiraMigrator(object):
                 "destinationId": child_issue["externalId"],
             }
 
-    def _write_json_file(self, import_json):
-        output_file = self._config["jira"]["json"]["filepath"]
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        with open(output_file, "w") as f:
-            json.dump(import_json, f)
+
+_worker_migrator = None
+
+
+def _init_translation_worker(config, verbose, skip_attachment_upload, graph):
+    global _worker_migrator
+    _worker_migrator = JiraMigrator(config, verbose)
+    _worker_migrator.graph = graph
+    _worker_migrator.translator = RallyArtifactTranslator(
+        _worker_migrator, skip_attachment_upload
+    )
+
+
+def _translate_shard(object_ids):
+    migrator = _worker_migrator
+    # only report what this shard introduced, the parent merges them in order
+    migrator.jira_users = {}
+    migrator.project["versions"] = []
+    migrator.pending_uploads = []
+    text_cache = migrator.translator.text_translator.cache
+    text_cache.stats.clear()
+    translations = []
+    for object_id in object_ids:
+        artifact = migrator.get_rally_artifact(object_id)
+        if artifact:
+            translations.append((object_id, migrator.translate_artifact(artifact)))
+    return (
+        translations,
+        migrator.jira_users,
+        migrator.project["versions"],
+        text_cache.stats,
+        migrator.pending_uploads,
+    )
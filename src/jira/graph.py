@@ -0,0 +1,84 @@
+from src.rally.artifacts import CHILD_ATTRIBUTES
+
+
+def iter_children(artifact):
+    for (key, _) in CHILD_ATTRIBUTES:
+        yield from artifact.get(key, [])
+
+
+class ArtifactGraph(object):
+    """Every artifact reachable from the dump, indexed by ObjectID.
+
+    Each node is owned by exactly one top-level artifact, the one that translates it,
+    so artifacts embedded as children of several others are only emitted once.
+    """
+
+    def __init__(self, artifact_mappings):
+        self.artifact_mappings = artifact_mappings
+        self.nodes = {}
+        self.owners = {}
+        self.parents = {}
+        self.duplicates = 0
+
+    def _add_node(self, artifact):
+        if artifact["objectId"] not in self.nodes:
+            self.nodes[artifact["objectId"]] = {
+                "externalId": artifact["formattedId"],
+                "type": artifact["type"],
+                "issueType": self.artifact_mappings.get(artifact["type"]),
+                "summary": artifact["name"],
+            }
+
+    def add_top_level(self, object_ids):
+        for object_id in object_ids:
+            self.owners[object_id] = object_id
+
+    def add_artifact(self, artifact):
+        owner = artifact["objectId"]
+        self._add_node(artifact)
+        if artifact.get("parent"):
+            self._add_node(artifact["parent"])
+            self.parents[owner] = artifact["parent"]["objectId"]
+        self._add_children(artifact, owner)
+
+    def _add_children(self, artifact, owner):
+        for child in iter_children(artifact):
+            object_id = child["objectId"]
+            if object_id in self.owners and self.owners[object_id] != owner:
+                self.duplicates += 1
+            self._add_node(child)
+            self.owners.setdefault(object_id, owner)
+            self.parents.setdefault(object_id, artifact["objectId"])
+            self._add_children(child, owner)
+
+    def is_emitted(self, object_id):
+        return object_id in self.owners
+
+    def decorate_issue(self, object_id, issue):
+        """Add the Epic label & Epic Link an issue gets from its parent."""
+        parent_id = self.parents.get(object_id)
+        parent = self.nodes.get(parent_id)
+        if not parent:
+            return
+        if parent["issueType"] == "Epic" and self.is_emitted(parent_id):
+            issue["customFieldValues"].append(
+                {
+                    "fieldName": "Epic Link",
+                    "fieldType": "com.pyxis.greenhopper.jira:gh-epic-link",
+                    "value": parent["summary"],
+                }
+            )
+        elif parent["type"] == "PortfolioItem/Epic":
+            # epics that are not imported themselves are kept as labels
+            issue["labels"].append(parent["summary"])
+
+    def edges(self):
+        """Yield (parent, child) nodes for links between emitted non-epic issues."""
+        for (child_id, parent_id) in self.parents.items():
+            parent = self.nodes[parent_id]
+            if (
+                self.is_emitted(child_id)
+                and self.is_emitted(parent_id)
+                and parent["issueType"] != "Epic"
+            ):
+                yield parent, self.nodes[child_id]
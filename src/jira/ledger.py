@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+
+
+class UploadLedger(object):
+    """Append-only record of the attachments already in S3, keyed by S3 key.
+
+    Every upload is appended as it lands so an interrupted run keeps what it did,
+    later lines win when the ledger is read back.
+    """
+
+    def __init__(self, config):
+        self.path = config["aws"].get(
+            "ledger_path",
+            os.path.join(
+                os.path.dirname(config["jira"]["json"]["filepath"]),
+                "upload-ledger.jsonl",
+            ),
+        )
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(self.path):
+            complete = 0
+            with open(self.path, "r") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    complete += len(line.encode())
+                    entry = json.loads(line)
+                    self.entries[entry.pop("key")] = entry
+            # a crash may leave the last line half written, drop it before appending
+            os.truncate(self.path, complete)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, "a")
+
+    def is_uploaded(self, s3_key, size, sha256):
+        entry = self.entries.get(s3_key)
+        return bool(entry) and entry["size"] == size and entry["sha256"] == sha256
+
+    def record(self, s3_key, size, sha256, etag=None):
+        entry = {"size": size, "sha256": sha256, "etag": etag}
+        with self._lock:
+            self.entries[s3_key] = entry
+            self._file.write(json.dumps({"key": s3_key, **entry}))
+            self._file.write("\n")
+            self._file.flush()
+
+    def reconcile(self, s3_client, bucket_name, prefix="attachments/"):
+        """Sync the ledger with one paged bucket listing instead of a HEAD per key.
+
+        The listing is also where ETags come from, upload_file does not return one.
+        """
+        listed = {}
+        paginator = s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                listed[obj["Key"]] = obj
+
+        with self._lock:
+            for s3_key in list(self.entries):
+                obj = listed.get(s3_key)
+                if not obj or obj["Size"] != self.entries[s3_key]["size"]:
+                    del self.entries[s3_key]
+            for (s3_key, obj) in listed.items():
+                if s3_key in self.entries:
+                    self.entries[s3_key]["etag"] = obj["ETag"].strip('"')
+                else:
+                    # content addressed keys carry their hash as the file name
+                    self.entries[s3_key] = {
+                        "size": obj["Size"],
+                        "sha256": os.path.basename(s3_key),
+                        "etag": obj["ETag"].strip('"'),
+                    }
+            self._compact()
+        return len(listed)
+
+    def _compact(self):
+        self._file.close()
+        tmp_path = f"{self.path}.part"
+        with open(tmp_path, "w") as f:
+            for (s3_key, entry) in self.entries.items():
+                f.write(json.dumps({"key": s3_key, **entry}))
+                f.write("\n")
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
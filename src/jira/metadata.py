@@ -0,0 +1,95 @@
+import os
+import time
+
+from src import codec
+
+from .search import IssueSearch
+
+EXTERNAL_ID_FIELD = "External issue ID"
+
+
+class JiraMetadata(object):
+    """Field ids & the externalId to issue mapping, cached on disk.
+
+    Every section is fetched the first time it is needed and kept for ttl_hours,
+    so commands resolve lookups locally instead of one API call per item.
+    """
+
+    def __init__(self, jira, config):
+        settings = config["jira"].get("metadata", {})
+        self.jira = jira
+        self.project = config["jira"]["project"]["key"]
+        self.path = settings.get(
+            "path",
+            os.path.join(
+                os.path.dirname(config["jira"]["json"]["filepath"]),
+                "jira-metadata.json",
+            ),
+        )
+        self.ttl = settings.get("ttl_hours", 24) * 60 * 60
+        self._sections = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._sections = codec.load(f)
+
+    def _section(self, name, loader):
+        section = self._sections.get(name)
+        if not section or time.time() - section["fetchedAt"] > self.ttl:
+            section = {"fetchedAt": time.time(), "values": loader()}
+            self._sections[name] = section
+            self.save()
+        return section["values"]
+
+    def refresh(self):
+        self._sections = {}
+        self.fields()
+        self.issues()
+
+    def invalidate(self, name):
+        self._sections.pop(name, None)
+        self.save()
+
+    def fields(self):
+        return self._section(
+            "fields",
+            lambda: {field["name"]: field["id"] for field in self.jira.fields()},
+        )
+
+    def issues(self):
+        """externalId -> {"key", "id"} of every issue in the project."""
+        return self._section("issues", self._load_issues)
+
+    def _load_issues(self):
+        issues = {}
+        self._search_issues(issues, f"project='{self.project}'")
+        return issues
+
+    def _search_issues(self, issues, jql):
+        external_id_field = self.field_id(EXTERNAL_ID_FIELD)
+        for issue in IssueSearch(self.jira, jql, fields=(external_id_field,)):
+            external_id = getattr(issue.fields, external_id_field, None)
+            if external_id:
+                issues[external_id] = {"key": issue.key, "id": issue.id}
+
+    def resolve(self, external_ids, batch_size=50):
+        """Return the issues of external_ids, searching for cache misses in batches."""
+        issues = self.issues()
+        missing = sorted(set(external_ids) - set(issues))
+        for start in range(0, len(missing), batch_size):
+            batch = ", ".join(f'"{e}"' for e in missing[start : start + batch_size])
+            self._search_issues(
+                issues, f'"{EXTERNAL_ID_FIELD}[Short text]" in ({batch})'
+            )
+        if missing:
+            self.save()
+        return {e: issues[e] for e in external_ids if e in issues}
+
+    def field_id(self, name):
+        return self.fields()[name]
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.part"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            codec.dump(self._sections, f)
+        os.replace(tmp_path, self.path)
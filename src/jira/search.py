@@ -0,0 +1,63 @@
+PAGE_SIZE = 100
+
+
+class IssueSearch(object):
+    """Pages through a JQL search, fetching only the fields a command needs.
+
+    A consuming search is for commands whose work drops issues out of the results,
+    e.g. deleting them, so every page is read from the front of what remains.
+    """
+
+    def __init__(self, jira, jql, fields, page_size=PAGE_SIZE, consuming=False):
+        self.jira = jira
+        self.jql = jql
+        self.fields = ",".join(fields)
+        self.page_size = page_size
+        self.consuming = consuming
+
+    def count(self):
+        # a falsy maxResults makes jira fetch every page, so ask for one key
+        return self.jira.search_issues(self.jql, maxResults=1, fields="key").total
+
+    def pages(self):
+        start_at = 0
+        # keys of issues handed out, so leftovers a consumer failed on are skipped
+        seen = set()
+        # whether this pass from the front of the results found anything new
+        found = False
+        while True:
+            page = self.jira.search_issues(
+                self.jql,
+                startAt=start_at,
+                maxResults=self.page_size,
+                fields=self.fields,
+            )
+            if not self.consuming:
+                if not page:
+                    return
+                start_at += len(page)
+                yield page
+                if start_at >= page.total:
+                    return
+                continue
+
+            fresh = [issue for issue in page if issue.key not in seen]
+            if fresh:
+                found = True
+                start_at += len(page) - len(fresh)
+                seen.update(issue.key for issue in fresh)
+                yield fresh
+            elif page and start_at + len(page) < page.total:
+                # a page of leftovers, look past it
+                start_at += len(page)
+            elif found:
+                # the index may still have listed consumed issues & thrown the
+                # offset past live ones, so read again from the front
+                start_at = 0
+                found = False
+            else:
+                return
+
+    def __iter__(self):
+        for page in self.pages():
+            yield from page
@@ -1,4 +1,10 @@
+import collections
+import hashlib
+import importlib.metadata
+import os
 import re
+import sqlite3
+import threading
 from urllib.parse import urlparse
 
 import html2jira
@@ -6,6 +12,83 @@ import html2jira
 HYPERLINK_RE = re.compile(
     r"(?P<url>https?://[^\s]+)",
 )
+# bodywidth set to 0 so no wrapping
+# Reduce the amount of inline links/images in text & comments
+HTML2JIRA_SETTINGS = {"bodywidth": 0, "ignore_links": True, "ignore_images": True}
+try:
+    # part of every cache key, so upgrading html2jira invalidates the cache
+    HTML2JIRA_VERSION = importlib.metadata.version("html2jira")
+except importlib.metadata.PackageNotFoundError:
+    HTML2JIRA_VERSION = ""
+
+
+class ConversionCache(object):
+    """In-memory LRU in front of an on-disk SQLite cache of HTML to Jira conversions."""
+
+    def __init__(self, path=None, max_size=4096):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = collections.Counter()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=OFF")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS conversions"
+                " (key TEXT PRIMARY KEY, plaintext TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def key(html):
+        settings = sorted(HTML2JIRA_SETTINGS.items())
+        return hashlib.sha256(
+            f"{HTML2JIRA_VERSION}{settings}{html}".encode()
+        ).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["memory"] += 1
+                return self._entries[key]
+            row = (
+                self._db
+                and self._db.execute(
+                    "SELECT plaintext FROM conversions WHERE key = ?", (key,)
+                ).fetchone()
+            )
+            if row:
+                self.stats["disk"] += 1
+                self._remember(key, row[0])
+                return row[0]
+            self.stats["misses"] += 1
+
+    def put(self, key, plaintext):
+        with self._lock:
+            self._remember(key, plaintext)
+            if self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO conversions VALUES (?, ?)", (key, plaintext)
+                )
+                self._db.commit()
+
+    def _remember(self, key, plaintext):
+        self._entries[key] = plaintext
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def report(self):
+        total = sum(self.stats.values()) or 1
+        return (
+            f"HTML conversions: {self.stats['memory']} memory hits,"
+            f" {self.stats['disk']} disk hits, {self.stats['misses']} misses"
+            f" ({(self.stats['memory'] + self.stats['disk']) / total:.0%} hit rate)"
+        )
 
 
 class RallyTextTranslator(object):
@@ -14,14 +97,27 @@ class RallyTextTranslator(object):
         self.zendesk_domain = urlparse(
             f"https://{self._config['zendesk']['sdk']['subdomain']}.zendesk.com"
         ).netloc
+        cache_config = self._config["jira"].get("text_cache", {})
+        cache_path = None
+        if cache_config.get("enabled", True):
+            cache_path = cache_config.get(
+                "path",
+                os.path.join(
+                    os.path.dirname(self._config["jira"]["json"]["filepath"]),
+                    "html2jira-cache.sqlite",
+                ),
+            )
+        self.cache = ConversionCache(cache_path, cache_config.get("max_size", 4096))
 
     def rally_html_to_jira(self, html):
-        # bodywidth set to 0 so no wrapping
-        h = html2jira.HTML2Jira(bodywidth=0)
-        # Reduce the amount of inline links/images in text & comments
-        h.ignore_links = True
-        h.ignore_images = True
-        plaintext = h.handle(html).strip()
+        key = self.cache.key(html)
+        plaintext = self.cache.get(key)
+        if plaintext is None:
+            h = html2jira.HTML2Jira(bodywidth=HTML2JIRA_SETTINGS["bodywidth"])
+            h.ignore_links = HTML2JIRA_SETTINGS["ignore_links"]
+            h.ignore_images = HTML2JIRA_SETTINGS["ignore_images"]
+            plaintext = h.handle(html).strip()
+            self.cache.put(key, plaintext)
         zendesk_tickets = self.find_zendesk_tickets(plaintext)
         return (plaintext, zendesk_tickets)
 
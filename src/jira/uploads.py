@@ -0,0 +1,91 @@
+import concurrent.futures
+import os
+import threading
+import time
+
+import tqdm
+from boto3.s3.transfer import TransferConfig
+
+MEGABYTE = 1024 * 1024
+
+
+class AttachmentUploader(object):
+    """Uploads attachments to S3 on a bounded thread pool, apart from translation."""
+
+    def __init__(self, s3_client, config, ledger=None):
+        aws = config["aws"]
+        self.s3_client = s3_client
+        self.ledger = ledger
+        self.bucket_name = aws["bucket_name"]
+        workers = aws.get("upload_workers", 8)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=aws.get("multipart_threshold_mb", 8) * MEGABYTE,
+            multipart_chunksize=aws.get("multipart_chunksize_mb", 8) * MEGABYTE,
+            max_concurrency=aws.get("multipart_concurrency", 4),
+        )
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._pending = threading.BoundedSemaphore(workers * 4)
+        self._lock = threading.Lock()
+        self._keys = set()
+        self._started = time.time()
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.failures = []
+        self.progress = tqdm.tqdm(
+            desc="Uploading Attachments", unit="B", unit_scale=True, total=0
+        )
+
+    def submit(self, filepath, s3_key, sha256=None):
+        size = os.path.getsize(filepath)
+        with self._lock:
+            if s3_key in self._keys:
+                return
+            self._keys.add(s3_key)
+            if self.ledger and self.ledger.is_uploaded(s3_key, size, sha256):
+                self.skipped += 1
+                return
+            self.progress.total += size
+            self.progress.refresh()
+
+        # blocks translation once enough uploads are queued
+        self._pending.acquire()
+        future = self._executor.submit(self._upload, filepath, s3_key, size, sha256)
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+    def _upload(self, filepath, s3_key, size, sha256):
+        try:
+            self.s3_client.upload_file(
+                filepath,
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                Config=self.transfer_config,
+                Callback=self.progress.update,
+            )
+        except Exception as exc:
+            self.failures.append((s3_key, exc))
+            tqdm.tqdm.write(f"WARN - Failed to upload {filepath} to {s3_key}: {exc!r}")
+            return
+
+        if self.ledger:
+            # the ETag is filled in by the next --reconcile-ledger listing
+            self.ledger.record(s3_key, size, sha256)
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.progress.close()
+        if self.ledger:
+            self.ledger.close()
+
+    def report(self):
+        elapsed = time.time() - self._started
+        megabytes = self.bytes / MEGABYTE
+        return (
+            f"{self.files} attachments uploaded, {megabytes:.2f} MB in {elapsed:.2f}"
+            f" seconds ({megabytes / max(elapsed, 0.001):.2f} MB/s),"
+            f" {self.skipped} already uploaded, {len(self.failures)} failed"
+        )
@@ -0,0 +1,116 @@
+import os
+import shutil
+
+from src import codec
+
+
+class _ImportChunk(object):
+    def __init__(self, path):
+        self.path = path
+        self.issues_path = f"{path}.issues.part"
+        self.issues_file = open(self.issues_path, "w", encoding="utf-8")
+        self.num_issues = 0
+        self.num_bytes = 0
+        self.users = set()
+        self.versions = set()
+        self.links = []
+
+
+class ImportJSONWriter(object):
+    """Streams issues to disk, optionally split into self-contained import files."""
+
+    def __init__(self, config, max_issues=None, max_bytes=None, filepath=None):
+        self._config = config
+        self.filepath = filepath or config["jira"]["json"]["filepath"]
+        self.max_issues = max_issues
+        self.max_bytes = max_bytes
+        self.chunks = []
+        self._issue_chunks = {}
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+
+    def _chunk_path(self, number):
+        root, extension = os.path.splitext(self.filepath)
+        return f"{root}-{number:03d}{extension}"
+
+    def _current_chunk(self, size):
+        chunk = self.chunks[-1] if self.chunks else None
+        if (
+            chunk is None
+            or (self.max_issues and chunk.num_issues >= self.max_issues)
+            or (
+                self.max_bytes
+                and chunk.num_issues
+                and chunk.num_bytes + size > self.max_bytes
+            )
+        ):
+            if chunk:
+                chunk.issues_file.close()
+            chunk = _ImportChunk(self._chunk_path(len(self.chunks) + 1))
+            self.chunks.append(chunk)
+        return chunk
+
+    @staticmethod
+    def _get_issue_users(issue):
+        users = {issue.get("reporter"), issue.get("assignee")}
+        users.update(comment["author"] for comment in issue["comments"])
+        users.update(attachment["attacher"] for attachment in issue["attachments"])
+        return users - {None}
+
+    def write_issue(self, issue):
+        data = codec.dumps(issue)
+        # max_bytes is a limit on the UTF-8 file, not on characters
+        size = len(data.encode())
+        chunk = self._current_chunk(size)
+        if chunk.num_issues:
+            chunk.issues_file.write(",")
+        chunk.issues_file.write(data)
+        chunk.num_issues += 1
+        chunk.num_bytes += size
+        chunk.users.update(self._get_issue_users(issue))
+        chunk.versions.update(issue.get("fixedVersions", ()))
+        self._issue_chunks[issue["externalId"]] = chunk
+
+    def has_issue(self, external_id):
+        return external_id in self._issue_chunks
+
+    def add_link(self, link):
+        # links belong with whichever end of the link is imported last
+        chunks = [
+            self._issue_chunks[external_id]
+            for external_id in (link["sourceId"], link["destinationId"])
+            if external_id in self._issue_chunks
+        ]
+        chunk = max(chunks, key=self.chunks.index) if chunks else self.chunks[-1]
+        chunk.links.append(link)
+
+    def close(self, project, users, versions):
+        """Write every import file and return their paths."""
+        if not self.chunks:
+            self._current_chunk(0)
+        self.chunks[-1].issues_file.close()
+        if len(self.chunks) == 1:
+            self.chunks[0].path = self.filepath
+
+        for chunk in self.chunks:
+            chunk_project = {
+                **project,
+                "versions": [v for v in versions if v["name"] in chunk.versions],
+            }
+            chunk_users = [u for u in users if u["name"] in chunk.users]
+            head = codec.dumps(
+                {
+                    "users": chunk_users,
+                    "links": chunk.links,
+                    "projects": [chunk_project],
+                }
+            )
+            # splice the streamed issues into the project, i.e. `...}]}`
+            with open(chunk.path, "w", encoding="utf-8") as f:
+                f.write(head[:-3])
+                f.write(',"issues":[')
+                with open(chunk.issues_path, "r", encoding="utf-8") as issues_file:
+                    shutil.copyfileobj(issues_file, f)
+                f.write("]}]}")
+            os.remove(chunk.issues_path)
+
+        return [chunk.path for chunk in self.chunks]
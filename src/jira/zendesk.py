@@ -0,0 +1,130 @@
+import collections
+import os
+import threading
+
+from zenpy.lib.api_objects import Link
+
+from src import codec
+
+from .bulk import BulkExecutor
+
+
+def _is_not_found(exc):
+    return getattr(getattr(exc, "response", None), "status_code", None) == 404
+
+
+def _get_error(exc):
+    response = getattr(exc, "response", None)
+    return getattr(response, "text", None) or str(exc)
+
+
+class ZendeskLinker(object):
+    """Brings Zendesk ticket links on Jira issues in line with what is wanted.
+
+    Every existing link is fetched once up front, so only the missing links are
+    created & the unwanted ones deleted, never one listing per issue.
+    """
+
+    def __init__(self, zenpy_client, settings=None, dry_run=False):
+        self.zenpy_client = zenpy_client
+        self.settings = settings or {}
+        self.dry_run = dry_run
+        self._lock = threading.Lock()
+        self.links = collections.defaultdict(dict)
+        self.results = []
+
+    def prefetch(self):
+        for link in self.zenpy_client.jira_links():
+            self.links[str(link.issue_id)][str(link.ticket_id)] = link
+        return sum(len(links) for links in self.links.values())
+
+    def sync(self, wanted, issue_ids=()):
+        """Create the wanted (issue id, issue key, ticket id) links that are missing.
+
+        Links on issue_ids that are not wanted are deleted.
+        """
+        wanted_keys = set()
+        to_create = []
+        for (issue_id, issue_key, ticket_id) in wanted:
+            key = (str(issue_id), str(ticket_id))
+            if key in wanted_keys:
+                continue
+            wanted_keys.add(key)
+            if key[1] in self.links.get(key[0], {}):
+                self._record("create", key, issue_key, "exists")
+            else:
+                to_create.append((key, issue_key, None))
+        to_delete = [
+            ((issue_id, ticket_id), link.issue_key, link)
+            for issue_id in map(str, issue_ids)
+            for (ticket_id, link) in self.links.get(issue_id, {}).items()
+            if (issue_id, ticket_id) not in wanted_keys
+        ]
+
+        self._run("Creating Zendesk links", to_create, self._create, "create")
+        self._run("Deleting Zendesk links", to_delete, self._delete, "delete")
+
+    def delete_links(self, issue_id):
+        """Delete the links of one issue, e.g. from inside another bulk operation.
+
+        Safe to retry, links are forgotten as they go & already deleted ones skipped.
+        """
+        links = self.links.get(str(issue_id), {})
+        for ticket_id in list(links):
+            self._delete_link(links[ticket_id])
+            links.pop(ticket_id, None)
+        self.links.pop(str(issue_id), None)
+
+    def _delete_link(self, link):
+        try:
+            self.zenpy_client.jira_links.delete(link)
+        except Exception as exc:
+            # gone already, e.g. deleted by an attempt that was then throttled
+            if not _is_not_found(exc):
+                raise
+
+    def _run(self, description, items, operation, action):
+        executor = BulkExecutor(
+            description, total=len(items), dry_run=self.dry_run, **self.settings
+        )
+        executor.run(items, operation, label=lambda item: item[0])
+        executor.close()
+        failures = dict(executor.failures)
+        for (key, issue_key, _) in items:
+            if self.dry_run:
+                self._record(action, key, issue_key, "planned")
+            elif key in failures:
+                self._record(action, key, issue_key, "failed", failures[key])
+            else:
+                self._record(action, key, issue_key, f"{action}d")
+
+    def _create(self, item):
+        ((issue_id, ticket_id), issue_key, _) = item
+        self.zenpy_client.jira_links.create(
+            Link(issue_id=issue_id, issue_key=issue_key, ticket_id=ticket_id)
+        )
+
+    def _delete(self, item):
+        (_, _, link) = item
+        self._delete_link(link)
+
+    def _record(self, action, key, issue_key, status, exc=None):
+        result = {
+            "action": action,
+            "issueId": key[0],
+            "issueKey": issue_key,
+            "ticketId": key[1],
+            "status": status,
+        }
+        if exc is not None:
+            result["error"] = _get_error(exc)
+        with self._lock:
+            self.results.append(result)
+
+    def summary(self):
+        return dict(collections.Counter(result["status"] for result in self.results))
+
+    def write_report(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            codec.dump({"summary": self.summary(), "results": self.results}, f)
@@ -1 +1,4 @@
 from .core import Rally
+from .dump import RallyDumper
+from .manifest import SectionManifest
+from .store import STORE_BACKENDS, get_artifact_store, migrate_artifact_store
@@ -5,7 +5,82 @@ import os
 import tqdm
 from pyral.entity import UnreferenceableOIDError
 
+from src import codec
 from .attachments import RallyAttachment
+from .cache import ReferenceCache
+from .store import get_artifact_store
+
+# artifacts only reachable as a parent or child are written here when normalized
+RELATED_DIRECTORY = "_related"
+CHILD_ATTRIBUTES = (
+    ("children", "Children"),
+    ("stories", "UserStories"),
+    ("tasks", "Tasks"),
+)
+CUSTOM_FIELD_ATTRIBUTES = (
+    ("components", "c_Component"),
+    ("clientNames", "c_ClientName"),
+)
+DEFECT_DETAIL_ATTRIBUTES = (
+    ("actualResults", "ActualResults"),
+    ("expectedResults", "ExpectedResults"),
+    ("rootCause", "RootCause"),
+    ("siteURL", "SiteURL"),
+    ("stepsToReproduce", "StepstoReproduce"),
+)
+# Every attribute RallyArtifactJSONSerializer reads. WSAPI applies a fetch list to
+# nested references too, so the Release, Iteration, User, Milestone, Blocker,
+# Discussion & Attachment sub-fields come back hydrated in the same response.
+FETCH_FIELDS = (
+    "ObjectID",
+    "FormattedID",
+    "LastUpdateDate",
+    "Project",
+    "Name",
+    "Release",
+    "State",
+    "ScheduleState",
+    "Iteration",
+    "Blocked",
+    "BlockedReason",
+    "Blocker",
+    "BlockedBy",
+    "Priority",
+    "Description",
+    "Notes",
+    "Milestones",
+    "TargetDate",
+    "AcceptanceCriteria",
+    "CreatedBy",
+    "CreationDate",
+    "Owner",
+    "EmailAddress",
+    "FirstName",
+    "LastName",
+    "PlanEstimate",
+    "DragAndDropRank",
+    "Environment",
+    "Attachments",
+    "User",
+    "Discussion",
+    "Text",
+    "Parent",
+    "StartDate",
+    "EndDate",
+    "ReleaseStartDate",
+    "ReleaseDate",
+    "PlannedVelocity",
+    "Theme",
+) + tuple(attr for (_, attr) in CHILD_ATTRIBUTES + CUSTOM_FIELD_ATTRIBUTES)
+ENTITY_FETCH_FIELDS = {
+    "Defect": tuple(attr for (_, attr) in DEFECT_DETAIL_ATTRIBUTES),
+}
+
+
+def fetch_fields(entity, extra_fields=()):
+    """Return the WSAPI fetch list needed to serialize artifacts of an entity type."""
+    fields = FETCH_FIELDS + ENTITY_FETCH_FIELDS.get(entity, ()) + tuple(extra_fields)
+    return ",".join(dict.fromkeys(fields))
 
 
 def _format_user(user):
@@ -26,12 +101,20 @@ class RallyArtifactJSONSerializer(json.JSONEncoder):
     def __init__(self, *args, **kwargs):
         self.download_attachments = kwargs.pop("download_attachments", False)
         self.force_cache = kwargs.pop("force_cache", False)
+        self.reference_cache = kwargs.pop("reference_cache", None) or ReferenceCache()
+        self.normalized = kwargs.pop("normalized", False)
+        self.on_related = kwargs.pop("on_related", None)
+        self.downloader = kwargs.pop("downloader", None)
         super(RallyArtifactJSONSerializer, self).__init__(*args, **kwargs)
 
     def default(self, obj):
         json_encoder = functools.partial(json.JSONEncoder.default, self)
         if isinstance(obj, RallyArtifact):
-            json_encoder = self._encode_rally_artifact_as_json
+            json_encoder = functools.partial(
+                self._encode_rally_artifact_as_json,
+                recurse_parent=obj.recurse_parent,
+                recurse_children=obj.recurse_children,
+            )
 
         return json_encoder(obj)
 
@@ -56,7 +139,7 @@ class RallyArtifactJSONSerializer(json.JSONEncoder):
             "notes": rally_artifact.Notes,
             "milestones": self._get_milestones(rally_artifact),
             "acceptanceCriteria": rally_artifact._get_or_none("AcceptanceCriteria"),
-            "createdBy": _format_user(rally_artifact.CreatedBy),
+            "createdBy": self._get_user(rally_artifact.CreatedBy),
             "creationDate": rally_artifact.CreationDate,
             "owner": self._get_owner(rally_artifact),
             "planEstimate": rally_artifact._get_or_none("PlanEstimate"),
@@ -65,7 +148,7 @@ class RallyArtifactJSONSerializer(json.JSONEncoder):
             "attachments": self._get_attachments(rally_artifact),
             "discussion": [
                 {
-                    "user": _format_user(comment.User),
+                    "user": self._get_user(comment.User),
                     "text": comment.Text,
                     "creationDate": comment.CreationDate,
                 }
@@ -73,17 +156,24 @@ class RallyArtifactJSONSerializer(json.JSONEncoder):
             ],
         }
 
-        if recurse_parent:
-            artifact["parent"] = self._get_parent(rally_artifact)
-
-        if recurse_children:
-            for (key, attr) in (
-                ("children", "Children"),
-                ("stories", "UserStories"),
-                ("tasks", "Tasks"),
-            ):
+        if self.normalized:
+            artifact["normalized"] = True
+            artifact["parent"] = self._get_parent_reference(
+                rally_artifact, follow=recurse_parent
+            )
+            for (key, attr) in CHILD_ATTRIBUTES:
                 if hasattr(rally_artifact, attr):
-                    artifact[key] = self._get_children(rally_artifact, attr=attr)
+                    artifact[key] = self._get_children_references(
+                        rally_artifact, attr=attr, follow=recurse_children
+                    )
+        else:
+            if recurse_parent:
+                artifact["parent"] = self._get_parent(rally_artifact)
+
+            if recurse_children:
+                for (key, attr) in CHILD_ATTRIBUTES:
+                    if hasattr(rally_artifact, attr):
+                        artifact[key] = self._get_children(rally_artifact, attr=attr)
 
         artifact.update(**self._get_custom_fields(rally_artifact))
 
@@ -98,12 +188,15 @@ class RallyArtifactJSONSerializer(json.JSONEncoder):
             disable=rally_artifact.number_of_attachments == 0,
         ):
             if self.download_attachments:
-                attachment.cache_to_disk(self.force_cache)
+                if self.downloader:
+                    self.downloader.submit(attachment, self.force_cache)
+                else:
+                    attachment.cache_to_disk(self.force_cache)
 
             json_attachments.append(
                 {
                     "name": attachment.Name,
-                    "user": _format_user(attachment.User),
+                    "user": self._get_user(attachment.User),
                     "creationDate": attachment.CreationDate,
                     "objectId": attachment.ObjectID,
                     "description": attachment.Description,
@@ -114,15 +207,18 @@ class RallyArtifactJSONSerializer(json.JSONEncoder):
     def _get_blocker(self, rally_artifact):
         blocker = rally_artifact._get_or_none("Blocker")
         if blocker:
-            try:
-                return {
-                    "objectId": blocker.ObjectID,
-                    "name": blocker.Name,
-                    "blockedBy": _format_user(blocker.BlockedBy),
-                    "creationDate": blocker.CreationDate,
-                }
-            except UnreferenceableOIDError:
-                return
+            return self.reference_cache.get("Blocker", blocker, self._encode_blocker)
+
+    def _encode_blocker(self, blocker):
+        try:
+            return {
+                "objectId": blocker.ObjectID,
+                "name": blocker.Name,
+                "blockedBy": self._get_user(blocker.BlockedBy),
+                "creationDate": blocker.CreationDate,
+            }
+        except UnreferenceableOIDError:
+            return
 
     def _get_children(self, rally_artifact, attr="Children"):
         encoded_children = []
@@ -139,35 +235,58 @@ class RallyArtifactJSONSerializer(json.JSONEncoder):
                 )
         return encoded_children
 
+    def _get_children_references(self, rally_artifact, attr="Children", follow=True):
+        references = []
+        for child in rally_artifact._get_or_none(attr) or []:
+            if follow and self.on_related:
+                self.on_related(
+                    RallyArtifact(
+                        rally_artifact._config,
+                        child,
+                        RELATED_DIRECTORY,
+                        recurse_parent=False,
+                    )
+                )
+            references.append(ReferenceCache.object_id(child))
+        return references
+
     def _get_iteration(self, rally_artifact):
         iteration = rally_artifact._get_or_none("Iteration")
         if iteration:
-            return {
-                "objectId": iteration.ObjectID,
-                "name": iteration.Name,
-                "creationDate": iteration.CreationDate,
-                "startDate": iteration.StartDate,
-                "endDate": iteration.EndDate,
-                "state": iteration.State,
-                "planEstimate": iteration.PlanEstimate,
-                "plannedVelocity": iteration.PlannedVelocity,
-                "theme": iteration.Theme,
-            }
+            return self.reference_cache.get(
+                "Iteration", iteration, self._encode_iteration
+            )
+
+    def _encode_iteration(self, iteration):
+        return {
+            "objectId": iteration.ObjectID,
+            "name": iteration.Name,
+            "creationDate": iteration.CreationDate,
+            "startDate": iteration.StartDate,
+            "endDate": iteration.EndDate,
+            "state": iteration.State,
+            "planEstimate": iteration.PlanEstimate,
+            "plannedVelocity": iteration.PlannedVelocity,
+            "theme": iteration.Theme,
+        }
 
     def _get_milestones(self, rally_artifact):
         return [
-            {
-                "formattedId": milestone.FormattedID,
-                "objectId": milestone.ObjectID,
-                "name": milestone.Name,
-                "targetDate": milestone.TargetDate,
-            }
+            self.reference_cache.get("Milestone", milestone, self._encode_milestone)
             for milestone in rally_artifact.Milestones
         ]
 
+    def _encode_milestone(self, milestone):
+        return {
+            "formattedId": milestone.FormattedID,
+            "objectId": milestone.ObjectID,
+            "name": milestone.Name,
+            "targetDate": milestone.TargetDate,
+        }
+
     def _get_owner(self, rally_artifact):
         if rally_artifact.Owner:
-            return _format_user(rally_artifact.Owner)
+            return self._get_user(rally_artifact.Owner)
 
     def _get_parent(self, rally_artifact):
         parent = rally_artifact._get_or_none("Parent")
@@ -179,20 +298,40 @@ class RallyArtifactJSONSerializer(json.JSONEncoder):
                 parent_artifact, recurse_children=False
             )
 
+    def _get_parent_reference(self, rally_artifact, follow=True):
+        parent = rally_artifact._get_or_none("Parent")
+        if parent:
+            if follow and self.on_related:
+                self.on_related(
+                    RallyArtifact(
+                        rally_artifact._config,
+                        parent,
+                        RELATED_DIRECTORY,
+                        recurse_children=False,
+                    )
+                )
+            return ReferenceCache.object_id(parent)
+
     def _get_release(self, rally_artifact):
-        artifact = rally_artifact._get_or_none("Release")
-        if artifact:
-            return {
-                "objectId": artifact.ObjectID,
-                "name": artifact.Name,
-                "creationDate": artifact.CreationDate,
-                "releaseStartDate": artifact.ReleaseStartDate,
-                "releaseDate": artifact.ReleaseDate,
-                "state": artifact.State,
-                "planEstimate": artifact.PlanEstimate,
-                "plannedVelocity": artifact.PlannedVelocity,
-                "theme": artifact.Theme,
-            }
+        release = rally_artifact._get_or_none("Release")
+        if release:
+            return self.reference_cache.get("Release", release, self._encode_release)
+
+    def _encode_release(self, release):
+        return {
+            "objectId": release.ObjectID,
+            "name": release.Name,
+            "creationDate": release.CreationDate,
+            "releaseStartDate": release.ReleaseStartDate,
+            "releaseDate": release.ReleaseDate,
+            "state": release.State,
+            "planEstimate": release.PlanEstimate,
+            "plannedVelocity": release.PlannedVelocity,
+            "theme": release.Theme,
+        }
+
+    def _get_user(self, user):
+        return self.reference_cache.get("User", user, _format_user)
 
     def _get_state(self, rally_artifact):
         state = rally_artifact._get_or_none("State")
@@ -202,10 +341,7 @@ class RallyArtifactJSONSerializer(json.JSONEncoder):
     def _get_custom_fields(self, rally_artifact):
         fields = {}
 
-        for (field_key, artifact_attr) in (
-            ("components", "c_Component"),
-            ("clientNames", "c_ClientName"),
-        ):
+        for (field_key, artifact_attr) in CUSTOM_FIELD_ATTRIBUTES:
             c_field = rally_artifact._get_or_none(artifact_attr)
             if c_field:
                 if isinstance(c_field, list):
@@ -219,21 +355,27 @@ class RallyArtifactJSONSerializer(json.JSONEncoder):
 
         if rally_artifact._type == "Defect":
             fields["defectDetails"] = {
-                "actualResults": rally_artifact.ActualResults,
-                "expectedResults": rally_artifact.ExpectedResults,
-                "rootCause": rally_artifact.RootCause,
-                "siteURL": rally_artifact.SiteURL,
-                "stepsToReproduce": rally_artifact.StepstoReproduce,
+                field_key: getattr(rally_artifact, artifact_attr)
+                for (field_key, artifact_attr) in DEFECT_DETAIL_ATTRIBUTES
             }
 
         return fields
 
 
 class RallyArtifact(object):
-    def __init__(self, config, artifact, artifact_directory):
+    def __init__(
+        self,
+        config,
+        artifact,
+        artifact_directory,
+        recurse_parent=True,
+        recurse_children=True,
+    ):
         self._config = config
         self._artifact = artifact
         self._artifact_directory = artifact_directory
+        self.recurse_parent = recurse_parent
+        self.recurse_children = recurse_children
 
     def __getattr__(self, attribute):
         return getattr(self._artifact, attribute)
@@ -246,31 +388,42 @@ class RallyArtifact(object):
         return os.path.join(config["rally"]["output_root"], "artifacts")
 
     @property
-    def disk_path(self):
-        return os.path.join(
-            self.output_root(self._config),
-            self._artifact_directory,
-            f"{self.ObjectID}.json",
-        )
+    def store(self):
+        return get_artifact_store(self._config)
 
     @property
     def is_on_disk(self):
-        return os.path.exists(self.disk_path)
+        return self.store.exists(self._artifact_directory, self.ObjectID)
 
     def json(self):
-        return json.dumps(self, cls=RallyArtifactJSONSerializer)
-
-    def cache_to_disk(self, download_attachments=False, force=False):
+        return codec.dumps(self, default=RallyArtifactJSONSerializer().default)
+
+    def cache_to_disk(
+        self,
+        download_attachments=False,
+        force=False,
+        force_attachments=None,
+        reference_cache=None,
+        normalized=False,
+        on_related=None,
+        downloader=None,
+    ):
         if not self.is_on_disk or force:
-            os.makedirs(os.path.dirname(self.disk_path), exist_ok=True)
-            with open(self.disk_path, "w") as f:
-                return json.dump(
-                    self,
-                    f,
-                    cls=RallyArtifactJSONSerializer,
-                    download_attachments=download_attachments,
-                    force_cache=force,
-                )
+            serializer = RallyArtifactJSONSerializer(
+                download_attachments=download_attachments,
+                force_cache=force if force_attachments is None else force_attachments,
+                reference_cache=reference_cache,
+                normalized=normalized,
+                on_related=on_related,
+                downloader=downloader,
+            )
+            self.store.put_object(
+                self._artifact_directory,
+                self.ObjectID,
+                self._type,
+                self,
+                default=serializer.default,
+            )
 
     @property
     def number_of_attachments(self):
@@ -1,5 +1,116 @@
 import base64
+import concurrent.futures
+import hashlib
+import json
 import os
+import tempfile
+import threading
+import time
+
+import tqdm
+
+# characters of base64 decoded at a time, keeps a 50mb attachment from being
+# held in memory twice while it is written to disk
+DECODE_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def _iter_base64(content):
+    remainder = ""
+    for start in range(0, len(content), DECODE_CHUNK_SIZE):
+        chunk = remainder + "".join(content[start : start + DECODE_CHUNK_SIZE].split())
+        usable = len(chunk) - len(chunk) % 4
+        remainder = chunk[usable:]
+        yield base64.b64decode(chunk[:usable])
+    if remainder:
+        yield base64.b64decode(remainder)
+
+
+def _write_base64(content, f, digest=None):
+    written = 0
+    for data in _iter_base64(content):
+        written += f.write(data)
+        if digest:
+            digest.update(data)
+    return written
+
+
+def hash_file(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for data in iter(lambda: f.read(DECODE_CHUNK_SIZE), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def _completed(result):
+    future = concurrent.futures.Future()
+    future.set_result(result)
+    return future
+
+
+class AttachmentIndex(object):
+    """Maps attachment ObjectIDs to the SHA-256 of their content-addressed blob."""
+
+    _indexes = {}
+    _indexes_lock = threading.Lock()
+
+    def __init__(self, config):
+        self._config = config
+        self._lock = threading.Lock()
+        self.hashes = {}
+        if os.path.exists(self.disk_path):
+            with open(self.disk_path, "r") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.hashes[entry["objectId"]] = entry["sha256"]
+
+    @classmethod
+    def for_config(cls, config):
+        root = RallyAttachment.output_root(config)
+        with cls._indexes_lock:
+            if root not in cls._indexes:
+                cls._indexes[root] = cls(config)
+            return cls._indexes[root]
+
+    @property
+    def disk_path(self):
+        return os.path.join(RallyAttachment.output_root(self._config), "index.jsonl")
+
+    def blob_path(self, sha256):
+        return os.path.join(
+            RallyAttachment.output_root(self._config), "sha256", sha256[:2], sha256
+        )
+
+    def get(self, object_id):
+        return self.hashes.get(int(object_id))
+
+    def record(self, object_id, sha256):
+        with self._lock:
+            if self.hashes.get(int(object_id)) == sha256:
+                return
+            self.hashes[int(object_id)] = sha256
+            with open(self.disk_path, "a") as f:
+                f.write(json.dumps({"objectId": int(object_id), "sha256": sha256}))
+                f.write("\n")
+
+    def lookup_or_hash(self, object_id, filepath):
+        """Return an attachment's hash, adopting files dumped before the index."""
+        sha256 = self.get(object_id)
+        if sha256 is None and os.path.exists(filepath):
+            sha256 = self.store(object_id, filepath)
+        return sha256
+
+    def store(self, object_id, filepath, sha256=None):
+        sha256 = sha256 or hash_file(filepath)
+        blob_path = self.blob_path(sha256)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            try:
+                os.link(filepath, blob_path)
+            except FileExistsError:
+                pass
+        self.record(object_id, sha256)
+        return sha256
 
 
 class RallyAttachment(object):
@@ -31,10 +142,147 @@ class RallyAttachment(object):
         return os.path.exists(self.disk_path)
 
     def cache_to_disk(self, force=False):
+        written = 0
         if not self.is_on_disk or force:
+            index = AttachmentIndex.for_config(self._config)
+            digest = hashlib.sha256()
             os.makedirs(os.path.dirname(self.disk_path), exist_ok=True)
-            with open(self.disk_path, "wb") as f:
-                f.write(base64.b64decode(self._attachment.Content.Content))
+            # a temp file of its own, so concurrent writers never share one
+            fd, tmp_path = tempfile.mkstemp(
+                suffix=".part", dir=os.path.dirname(self.disk_path)
+            )
+            os.chmod(tmp_path, 0o644)
+            with os.fdopen(fd, "wb") as f:
+                written = _write_base64(self._attachment.Content.Content, f, digest)
+
+            # identical bytes are kept once under assets/sha256, the ref path
+            # is a hardlink to that blob so older readers keep working
+            sha256 = digest.hexdigest()
+            blob_path = index.blob_path(sha256)
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            if os.path.exists(blob_path):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, blob_path)
+            os.link(blob_path, tmp_path)
+            os.replace(tmp_path, self.disk_path)
+            index.record(self.ObjectID, sha256)
 
         self._attachment.Content.Content = ""
         self._attachment.Content._hydrated = False
+        return written
+
+
+class AttachmentDownloader(object):
+    """Downloads attachments on a thread pool while artifacts keep serializing."""
+
+    def __init__(self, workers=4, max_pending=None, journal=None):
+        # no workers downloads inline in the serializing thread
+        self._executor = workers and concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers
+        )
+        self._pending = threading.BoundedSemaphore(max_pending or max(workers, 1) * 4)
+        self.journal = journal
+        self._lock = threading.Lock()
+        # downloads by ObjectID, so an attachment shared by several artifacts
+        # is fetched once per run
+        self._in_flight = {}
+        self._done = {}
+        self._started = time.time()
+        self.files = 0
+        self.bytes = 0
+        self.failures = []
+
+    def submit(self, attachment, force=False):
+        if not self._executor:
+            return _completed(self._download(attachment, force))
+
+        object_id = attachment.ObjectID
+        with self._lock:
+            if object_id in self._done:
+                return _completed(self._done[object_id])
+            if object_id in self._in_flight:
+                return self._in_flight[object_id]
+            future = concurrent.futures.Future()
+            self._in_flight[object_id] = future
+
+        def _finished(download):
+            self._pending.release()
+            with self._lock:
+                self._done[object_id] = download.result()
+                del self._in_flight[object_id]
+            future.set_result(download.result())
+
+        # blocks the serializer once enough downloads are queued
+        self._pending.acquire()
+        self._executor.submit(self._download, attachment, force).add_done_callback(
+            _finished
+        )
+        return future
+
+    def batch(self):
+        return AttachmentBatch(self)
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=True)
+
+    def report(self):
+        elapsed = time.time() - self._started
+        megabytes = self.bytes / (1024 * 1024)
+        return (
+            f"{self.files} attachments downloaded, {megabytes:.2f} MB in {elapsed:.2f}"
+            f" seconds ({megabytes / max(elapsed, 0.001):.2f} MB/s),"
+            f" {len(self.failures)} failed"
+        )
+
+    def _download(self, attachment, force):
+        object_id = attachment.ObjectID
+        if self.journal and object_id in self.journal.attachments:
+            return True
+
+        try:
+            written = attachment.cache_to_disk(force)
+        except Exception as exc:
+            self.failures.append((object_id, exc))
+            tqdm.tqdm.write(
+                f"WARN - Failed to download attachment {object_id}: {exc!r}"
+            )
+            return False
+
+        if self.journal:
+            self.journal.record_attachment(object_id)
+        if written:
+            with self._lock:
+                self.files += 1
+                self.bytes += written
+        return True
+
+
+class AttachmentBatch(object):
+    """The downloads of a single artifact, so it is only journaled once they land."""
+
+    def __init__(self, downloader):
+        self._downloader = downloader
+        self.futures = []
+
+    def submit(self, attachment, force=False):
+        future = self._downloader.submit(attachment, force)
+        self.futures.append(future)
+        return future
+
+    def when_done(self, callback):
+        lock = threading.Lock()
+        remaining = [len(self.futures)]
+
+        def _done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            callback(all(future.result() for future in self.futures))
+
+        if not self.futures:
+            callback(True)
+        for future in self.futures:
+            future.add_done_callback(_done)
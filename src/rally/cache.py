@@ -0,0 +1,49 @@
+import collections
+import threading
+
+
+class ReferenceCache(object):
+    """ObjectID keyed LRU cache of encoded Rally reference objects shared across artifacts."""
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+
+    @staticmethod
+    def object_id(reference):
+        # pyral references know their oid from the _ref without being hydrated
+        return int(getattr(reference, "oid", None) or reference.ObjectID)
+
+    def get(self, kind, reference, encoder):
+        key = (kind, self.object_id(reference))
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits[kind] += 1
+                return self._entries[key]
+            self.misses[kind] += 1
+
+        value = encoder(reference)
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        kinds = sorted(set(self.hits) | set(self.misses))
+        return {kind: (self.hits[kind], self.misses[kind]) for kind in kinds}
+
+    def report(self):
+        lines = []
+        for kind, (hits, misses) in self.stats().items():
+            total = hits + misses
+            lines.append(
+                f"{kind}: {hits} hits / {misses} misses ({hits / total:.0%} hit rate)"
+            )
+        return "\n".join(lines)
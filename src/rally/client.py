@@ -0,0 +1,161 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.retry import RETRY_STATUSES, get_backoff
+
+THROTTLE_STATUSES = (429, 503)
+
+
+class RateLimiter(object):
+    """Token bucket shared by every thread talking to Rally."""
+
+    def __init__(self, requests_per_second):
+        self.rate = requests_per_second
+        self._lock = threading.Lock()
+        self._tokens = requests_per_second
+        self._updated = time.monotonic()
+
+    def wait(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.rate, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+class AdaptiveConcurrency(object):
+    """Caps requests in flight, halving on throttling and growing back while healthy."""
+
+    def __init__(self, minimum=1, maximum=8, increase_after=50):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = maximum
+        self.increase_after = increase_after
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, throttled=False):
+        with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                self._successes = 0
+                self.limit = max(self.minimum, self.limit // 2)
+            else:
+                self._successes += 1
+                if self._successes >= self.increase_after and self.limit < self.maximum:
+                    self._successes = 0
+                    self.limit += 1
+            self._condition.notify_all()
+
+
+class RequestStats(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+        self.latencies = []
+
+    def record(self, latency, retried=False, throttled=False, failed=False):
+        with self._lock:
+            self.requests += 1
+            self.retries += retried
+            self.throttled += throttled
+            self.failures += failed
+            self.latencies.append(latency)
+
+    def percentile(self, percent):
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return 0
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))]
+
+    def report(self):
+        return (
+            f"{self.requests} Rally requests, {self.retries} retries,"
+            f" {self.throttled} throttled, {self.failures} failed;"
+            f" latency p50 {self.percentile(50):.2f}s"
+            f" p90 {self.percentile(90):.2f}s p99 {self.percentile(99):.2f}s"
+        )
+
+
+class RallyTransportAdapter(HTTPAdapter):
+    """Rate limits, retries with jittered backoff and adapts concurrency for pyral."""
+
+    def __init__(self, settings, *args, **kwargs):
+        self.rate_limiter = RateLimiter(settings.get("requests_per_second", 10))
+        self.concurrency = AdaptiveConcurrency(
+            settings.get("min_concurrency", 1), settings.get("max_concurrency", 8)
+        )
+        self.max_retries_on_error = settings.get("max_retries", 5)
+        self.backoff_base = settings.get("backoff_base", 0.5)
+        self.backoff_max = settings.get("backoff_max", 30)
+        self.stats = RequestStats()
+        super(RallyTransportAdapter, self).__init__(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.concurrency.acquire()
+            self.rate_limiter.wait()
+            before = time.monotonic()
+            response = error = None
+            try:
+                response = super(RallyTransportAdapter, self).send(
+                    request, *args, **kwargs
+                )
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = exc
+            latency = time.monotonic() - before
+
+            throttled = (
+                response is not None and response.status_code in THROTTLE_STATUSES
+            )
+            self.concurrency.release(throttled=throttled)
+            retry = error is not None or response.status_code in RETRY_STATUSES
+            exhausted = attempt >= self.max_retries_on_error
+            self.stats.record(
+                latency,
+                retried=retry and not exhausted,
+                throttled=throttled,
+                failed=retry and exhausted,
+            )
+
+            if not retry:
+                return response
+            if exhausted:
+                if error is not None:
+                    raise error
+                return response
+
+            time.sleep(
+                get_backoff(attempt, response, self.backoff_base, self.backoff_max)
+            )
+            attempt += 1
+
+
+def install_transport(sdk, settings):
+    adapter = RallyTransportAdapter(settings)
+    sdk.session.mount("https://", adapter)
+    sdk.session.mount("http://", adapter)
+    return adapter
@@ -2,7 +2,8 @@ import time
 
 import pyral
 
-from .artifacts import RallyArtifact
+from .artifacts import RallyArtifact, fetch_fields
+from .client import install_transport
 
 
 class Rally(object):
@@ -16,29 +17,55 @@ class Rally(object):
             workspace=config["rally"]["sdk"]["workspace"],
             project=config["rally"]["sdk"].get("project"),
         )
+        self.transport = install_transport(self.sdk, config["rally"].get("client", {}))
         after = time.time()
         if self.verbose:
             print(f"Rally SDK initialized in {after - before:.2f} seconds")
 
-        self.artifacts = []
-        for section_name, section in config["rally"]["artifacts"].items():
-            self.artifacts += [
-                RallyArtifact(config, artifact, section_name)
-                for artifact in self._get_artifacts(section_name, section)
-            ]
+    def sections(self, watermarks=None):
+        """Yield each configured section with its (lazily paged) Rally response."""
+        watermarks = watermarks or {}
+        for section_name, section in self._config["rally"]["artifacts"].items():
+            yield section_name, self._get_artifacts(
+                section_name, section, watermarks.get(section_name)
+            )
 
-    def _get_artifacts(self, section_name, section):
+    def iter_artifacts(self, section_name, results):
+        for artifact in results:
+            yield RallyArtifact(self._config, artifact, section_name)
+
+    def _get_artifacts(self, section_name, section, watermark=None):
         before = time.time()
-        kwargs = {"query": section["query"], "threads": section["threads"]}
+        kwargs = {
+            "query": self._get_query(section["query"], watermark),
+            "threads": section["threads"],
+            "pagesize": section.get("pagesize", 200),
+        }
         artifacts = self.sdk.get(
             section["entity"],
-            fetch=True,
+            fetch=self._get_fetch(section),
             projectScopeDown=True,
             **kwargs,
         )
         after = time.time()
         if self.verbose:
             print(artifacts)
-            print(f"{section_name} loaded in {after - before:.2f} seconds")
+            print(f"{section_name} first page loaded in {after - before:.2f} seconds")
 
         return artifacts
+
+    def _get_fetch(self, section):
+        # `fetch = true` in a section restores fetching every attribute
+        extra_fields = section.get("fetch", [])
+        if extra_fields is True:
+            return True
+        return fetch_fields(section["entity"], extra_fields)
+
+    def _get_query(self, query, watermark):
+        if not watermark:
+            return query
+
+        updated_since = f'LastUpdateDate > "{watermark}"'
+        if isinstance(query, list):
+            return query + [updated_since]
+        return f"(({query}) AND ({updated_since}))"
@@ -0,0 +1,188 @@
+import concurrent.futures
+import threading
+
+import tqdm
+
+from .artifacts import RELATED_DIRECTORY
+from .attachments import AttachmentDownloader
+from .cache import ReferenceCache
+from .journal import DumpJournal, remove_partial_files
+from .manifest import SectionManifest
+
+
+class RallyDumper(object):
+    def __init__(
+        self,
+        config,
+        verbose,
+        workers=1,
+        download_attachments=False,
+        force=False,
+        normalized=False,
+        attachment_workers=4,
+        resume=False,
+    ):
+        self._config = config
+        self.verbose = verbose
+        self.workers = max(1, workers)
+        # never queue more artifacts than a couple of rounds of workers, this
+        # keeps memory flat and bounds the requests we have in flight to Rally
+        self.max_in_flight = self.workers * 2
+        self.download_attachments = download_attachments
+        self.force = force
+        self.reference_cache = ReferenceCache(
+            config["rally"].get("reference_cache_size", 4096)
+        )
+        self.normalized = normalized
+        self.failures = []
+        self._lock = threading.Lock()
+        self._dumped = set()
+        self._related = {}
+        self._manifests = {}
+        if resume:
+            remove_partial_files(config["rally"]["output_root"])
+        self.journal = DumpJournal(config, resume=resume)
+        for entry in self.journal.artifacts.values():
+            self.manifest(entry["section"]).record(
+                entry["objectId"], entry["lastUpdateDate"]
+            )
+        self.downloader = None
+        if download_attachments:
+            self.downloader = AttachmentDownloader(
+                workers=attachment_workers, journal=self.journal
+            )
+        self.skipped = 0
+
+    def dump(self, section_name, artifacts, total=None):
+        with tqdm.tqdm(desc=section_name, total=total) as progress:
+            if self.workers == 1:
+                for artifact in artifacts:
+                    self._cache_artifact(artifact)
+                    progress.update()
+                return
+
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers
+            ) as executor:
+                in_flight = set()
+                for artifact in artifacts:
+                    if len(in_flight) >= self.max_in_flight:
+                        done, in_flight = concurrent.futures.wait(
+                            in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+                        )
+                        progress.update(len(done))
+                    in_flight.add(executor.submit(self._cache_artifact, artifact))
+
+                for _ in concurrent.futures.as_completed(in_flight):
+                    progress.update()
+
+    def manifest(self, section_name):
+        with self._lock:
+            if section_name not in self._manifests:
+                self._manifests[section_name] = SectionManifest(
+                    self._config, section_name
+                )
+            return self._manifests[section_name]
+
+    def watermarks(self):
+        if self.force:
+            return {}
+        return {
+            section_name: self.manifest(section_name).watermark
+            for section_name in self._config["rally"]["artifacts"]
+        }
+
+    def save_manifests(self, started):
+        """Persist manifests, advancing watermarks of sections that dumped cleanly."""
+        failed_sections = {section_name for (section_name, _, _) in self.failures}
+        for section_name, manifest in self._manifests.items():
+            if (
+                section_name in self._config["rally"]["artifacts"]
+                and section_name not in failed_sections
+            ):
+                manifest.save(watermark=started)
+            else:
+                manifest.save()
+
+    def close(self):
+        if self.downloader:
+            self.downloader.close()
+        self.journal.close()
+
+    def dump_related(self):
+        """Write every parent/child reached while dumping normalized artifacts once."""
+        while True:
+            with self._lock:
+                pending = [
+                    artifact
+                    for object_id, artifact in self._related.items()
+                    if object_id not in self._dumped
+                ]
+                self._related.clear()
+
+            if not pending:
+                return
+
+            self.dump(RELATED_DIRECTORY, pending, total=len(pending))
+
+    def _queue_related(self, artifact):
+        object_id = ReferenceCache.object_id(artifact._artifact)
+        # relatives dumped under their own section by an earlier run are kept
+        # up to date by that section's incremental dumps
+        if any(
+            self.manifest(section_name).is_recorded(object_id)
+            for section_name in self._config["rally"]["artifacts"]
+        ):
+            return
+        with self._lock:
+            if object_id not in self._dumped:
+                self._related.setdefault(object_id, artifact)
+
+    def _cache_artifact(self, artifact):
+        try:
+            object_id = ReferenceCache.object_id(artifact._artifact)
+            with self._lock:
+                self._dumped.add(object_id)
+            if object_id in self.journal.artifacts:
+                with self._lock:
+                    self.skipped += 1
+                return
+
+            section_name = artifact._artifact_directory
+            manifest = self.manifest(section_name)
+            last_update_date = artifact._get_or_none("LastUpdateDate")
+            downloads = self.downloader and self.downloader.batch()
+            artifact.cache_to_disk(
+                download_attachments=self.download_attachments,
+                force=self.force or manifest.is_changed(object_id, last_update_date),
+                force_attachments=self.force,
+                reference_cache=self.reference_cache,
+                normalized=self.normalized,
+                on_related=self._queue_related if self.normalized else None,
+                downloader=downloads,
+            )
+
+            def _record(succeeded):
+                # artifacts with failed attachments are left out of the manifest
+                # & journal, and hold back the section watermark, so both
+                # --resume and the next incremental run redo them
+                if not succeeded:
+                    self.failures.append(
+                        (
+                            section_name,
+                            object_id,
+                            RuntimeError("attachments failed to download"),
+                        )
+                    )
+                    return
+                manifest.record(object_id, last_update_date)
+                self.journal.record_artifact(section_name, object_id, last_update_date)
+
+            if downloads:
+                downloads.when_done(_record)
+            else:
+                _record(True)
+        except Exception as exc:
+            object_id = artifact._get_or_none("ObjectID")
+            self.failures.append((artifact._artifact_directory, object_id, exc))
+            tqdm.tqdm.write(f"WARN - Failed to dump artifact {object_id}: {exc!r}")
@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+
+
+class DumpJournal(object):
+    """Append-only record of the artifacts & attachments a dump finished writing."""
+
+    def __init__(self, config, resume=False):
+        self._config = config
+        self._lock = threading.Lock()
+        self.artifacts = {}
+        self.attachments = set()
+        if resume and os.path.exists(self.disk_path):
+            self._load()
+        os.makedirs(os.path.dirname(self.disk_path), exist_ok=True)
+        self._file = open(self.disk_path, "a" if resume else "w")
+
+    @property
+    def disk_path(self):
+        return os.path.join(self._config["rally"]["output_root"], "journal.jsonl")
+
+    def _load(self):
+        with open(self.disk_path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # the last line may have been cut short when the run died
+                    continue
+                if entry["kind"] == "artifact":
+                    self.artifacts[entry["objectId"]] = entry
+                else:
+                    self.attachments.add(entry["objectId"])
+
+    def _append(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def record_artifact(self, section_name, object_id, last_update_date):
+        self.artifacts[object_id] = {
+            "kind": "artifact",
+            "section": section_name,
+            "objectId": object_id,
+            "lastUpdateDate": last_update_date,
+        }
+        self._append(self.artifacts[object_id])
+
+    def record_attachment(self, object_id):
+        self.attachments.add(object_id)
+        self._append({"kind": "attachment", "objectId": object_id})
+
+    def close(self):
+        self._file.close()
+
+
+def remove_partial_files(root):
+    """Delete the .part files an interrupted dump left behind."""
+    for (dirpath, _, files) in os.walk(root):
+        for filename in files:
+            if filename.endswith(".part"):
+                os.remove(os.path.join(dirpath, filename))
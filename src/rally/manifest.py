@@ -0,0 +1,58 @@
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+
+class SectionManifest(object):
+    """Per-section record of the last sync watermark and each artifact's LastUpdateDate."""
+
+    def __init__(self, config, section_name):
+        self._config = config
+        self.section_name = section_name
+        self._lock = threading.Lock()
+        self.watermark = None
+        self.artifacts = {}
+        if os.path.exists(self.disk_path):
+            with open(self.disk_path, "r") as f:
+                manifest = json.load(f)
+            self.watermark = manifest["watermark"]
+            self.artifacts = manifest["artifacts"]
+
+    @staticmethod
+    def output_root(config):
+        return os.path.join(config["rally"]["output_root"], "manifests")
+
+    @staticmethod
+    def now():
+        # Rally WSAPI expects ISO 8601 UTC timestamps in date queries
+        return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+    @property
+    def disk_path(self):
+        return os.path.join(self.output_root(self._config), f"{self.section_name}.json")
+
+    def is_changed(self, object_id, last_update_date):
+        recorded = self.artifacts.get(str(object_id))
+        if recorded is None:
+            # never recorded, so any copy on disk is from a run that did not
+            # finish it, e.g. its attachments were still downloading
+            return True
+        return recorded != last_update_date
+
+    def is_recorded(self, object_id):
+        return str(object_id) in self.artifacts
+
+    def record(self, object_id, last_update_date):
+        with self._lock:
+            self.artifacts[str(object_id)] = last_update_date
+
+    def save(self, watermark=None):
+        with self._lock:
+            if watermark:
+                self.watermark = watermark
+            os.makedirs(os.path.dirname(self.disk_path), exist_ok=True)
+            tmp_path = f"{self.disk_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"watermark": self.watermark, "artifacts": self.artifacts}, f)
+            os.replace(tmp_path, self.disk_path)
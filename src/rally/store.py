@@ -0,0 +1,233 @@
+import os
+import sqlite3
+import threading
+import zlib
+
+from src import codec
+
+
+class DirectoryArtifactStore(object):
+    """One <ObjectID>.json file per artifact under artifacts/<section>/."""
+
+    def __init__(self, config):
+        self._config = config
+        self.root = os.path.join(config["rally"]["output_root"], "artifacts")
+
+    def path(self, section_name, object_id):
+        return os.path.join(self.root, section_name, f"{object_id}.json")
+
+    def sections(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(entry.name for entry in os.scandir(self.root) if entry.is_dir())
+
+    def exists(self, section_name, object_id):
+        return os.path.exists(self.path(section_name, object_id))
+
+    def put(self, section_name, object_id, artifact_type, data):
+        path = self.path(section_name, object_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written aside & renamed so an interrupted dump never leaves half a file
+        tmp_path = f"{path}.part"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put_object(self, section_name, object_id, artifact_type, obj, default=None):
+        """Encode obj straight into its file rather than into a string first."""
+        path = self.path(section_name, object_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.part"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            codec.dump(obj, f, default=default)
+        os.replace(tmp_path, path)
+
+    def get(self, object_id, section_name=None):
+        for section in [section_name] if section_name else self.sections():
+            path = self.path(section, object_id)
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    return codec.load(f)
+
+    def keys(self, section_name=None):
+        for section in [section_name] if section_name else self.sections():
+            if not os.path.isdir(os.path.join(self.root, section)):
+                continue
+            for entry in os.scandir(os.path.join(self.root, section)):
+                object_id, extension = os.path.splitext(entry.name)
+                if extension == ".json":
+                    yield section, int(object_id)
+
+    def records(self, section_name=None, artifact_type=None):
+        """Yield (section, ObjectID, type, JSON text) for each stored artifact."""
+        for section, object_id in self.keys(section_name):
+            with open(self.path(section, object_id), "r", encoding="utf-8") as f:
+                data = f.read()
+            if artifact_type:
+                record_type = codec.loads(data)["type"]
+                if record_type != artifact_type:
+                    continue
+            else:
+                record_type = None
+            yield section, object_id, record_type, data
+
+    def artifacts(self, section_name=None, artifact_type=None):
+        for (section, _, _, data) in self.records(section_name, artifact_type):
+            yield section, codec.loads(data)
+
+    def close(self):
+        pass
+
+
+class SQLiteArtifactStore(object):
+    """All artifacts in one SQLite file, optionally compressed.
+
+    Keyed like the directory layout, so writing an artifact under _related never
+    displaces the same ObjectID dumped under its own section.
+    """
+
+    def __init__(self, config):
+        self._config = config
+        settings = config["rally"].get("store", {})
+        self.path = settings.get(
+            "path", os.path.join(config["rally"]["output_root"], "artifacts.sqlite")
+        )
+        self.compress = settings.get("compress", False)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts ("
+            " object_id INTEGER NOT NULL,"
+            " section TEXT NOT NULL,"
+            " type TEXT NOT NULL,"
+            " compressed INTEGER NOT NULL,"
+            " data BLOB NOT NULL,"
+            " PRIMARY KEY (section, object_id))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS artifacts_object_id ON artifacts (object_id)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS artifacts_section_type"
+            " ON artifacts (section, type)"
+        )
+        self._db.commit()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _decode(compressed, data):
+        return zlib.decompress(data).decode() if compressed else data
+
+    def sections(self):
+        return [row[0] for row in self._query("SELECT DISTINCT section FROM artifacts")]
+
+    def exists(self, section_name, object_id):
+        return bool(
+            self._query(
+                "SELECT 1 FROM artifacts WHERE object_id = ? AND section = ?",
+                (object_id, section_name),
+            )
+        )
+
+    def put(self, section_name, object_id, artifact_type, data):
+        if self.compress:
+            data = zlib.compress(data.encode())
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?)",
+                (object_id, section_name, artifact_type, int(self.compress), data),
+            )
+            self._db.commit()
+
+    def put_object(self, section_name, object_id, artifact_type, obj, default=None):
+        self.put(
+            section_name, object_id, artifact_type, codec.dumps(obj, default=default)
+        )
+
+    def get(self, object_id, section_name=None):
+        rows = self._query(
+            "SELECT section, compressed, data FROM artifacts WHERE object_id = ?",
+            (object_id,),
+        )
+        for (section, compressed, data) in rows:
+            if section_name is None or section == section_name:
+                return codec.loads(self._decode(compressed, data))
+
+    def _where(self, section_name, artifact_type):
+        clauses, params = [], []
+        if section_name:
+            clauses.append("section = ?")
+            params.append(section_name)
+        if artifact_type:
+            clauses.append("type = ?")
+            params.append(artifact_type)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def keys(self, section_name=None):
+        where, params = self._where(section_name, None)
+        for row in self._query(
+            f"SELECT section, object_id FROM artifacts{where} ORDER BY rowid", params
+        ):
+            yield row
+
+    def records(self, section_name=None, artifact_type=None):
+        """Yield (section, ObjectID, type, JSON text) for each stored artifact."""
+        where, params = self._where(section_name, artifact_type)
+        with self._lock:
+            # a separate cursor streams rows instead of fetching the whole table
+            cursor = self._db.cursor()
+            cursor.execute(
+                "SELECT object_id, section, type, compressed, data"
+                f" FROM artifacts{where} ORDER BY rowid",
+                params,
+            )
+        for (object_id, section, record_type, compressed, data) in cursor:
+            yield section, object_id, record_type, self._decode(compressed, data)
+
+    def artifacts(self, section_name=None, artifact_type=None):
+        for (section, _, _, data) in self.records(section_name, artifact_type):
+            yield section, codec.loads(data)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+STORE_BACKENDS = {
+    "directory": DirectoryArtifactStore,
+    "sqlite": SQLiteArtifactStore,
+}
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_artifact_store(config, backend=None):
+    """Return the shared artifact store configured in [rally.store]."""
+    backend = backend or config["rally"].get("store", {}).get("backend", "directory")
+    # keyed by process too, forked translation workers must open their own store
+    key = (os.getpid(), config["rally"]["output_root"], backend)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = STORE_BACKENDS[backend](config)
+        return _stores[key]
+
+
+def migrate_artifact_store(config, source, target, progress=iter):
+    if source == target:
+        raise ValueError(f"cannot migrate the {source} store onto itself")
+    source_store = get_artifact_store(config, source)
+    target_store = get_artifact_store(config, target)
+    migrated = 0
+    for (section, object_id, artifact_type, data) in progress(source_store.records()):
+        if artifact_type is None:
+            artifact_type = codec.loads(data)["type"]
+        target_store.put(section, object_id, artifact_type, data)
+        migrated += 1
+    return migrated
@@ -0,0 +1,13 @@
+"""Retry policy shared by the Rally transport & the Jira/Zendesk bulk executor."""
+import random
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def get_backoff(attempt, response, base, maximum):
+    """Seconds to wait before retrying, honouring the response's Retry-After."""
+    retry_after = response is not None and response.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    # full jitter exponential backoff
+    return random.uniform(0, min(maximum, base * 2**attempt))